@@ -59,10 +59,12 @@ def revision(ctx: Context, message: str) -> None:
     new_schema_path = os.path.join(dir, f"{num}-schema.sql")
     old_schema_path = os.path.join(dir, f"{num - 1}-schema.sql")
     cmd = shlex.split(repo.config.schema_dump_command)
+    # Capture the dump directly instead of writing it out and reading it back.
+    new_schema_sql = subprocess.run(
+        cmd, check=True, stdout=subprocess.PIPE, text=True
+    ).stdout
     with ctx.ui.open(new_schema_path, "w") as f:
-        subprocess.check_call(cmd, stdout=f)
-    with ctx.ui.open(new_schema_path, "r") as f:
-        new_schema_sql = f.read()
+        f.write(new_schema_sql)
     with open(old_schema_path, "r") as f:
         old_schema_sql = f.read()
 
@@ -2,11 +2,13 @@
 from __future__ import annotations
 
 import abc
+import atexit
 import contextlib
-import dataclasses
+import functools
 import os
-import random
 import re
+import secrets
+import uuid
 from urllib.parse import urlparse
 
 from .constants import SCHEMA_NAME, SHIM_SCHEMA_FORMAT
@@ -14,6 +16,7 @@ from contextlib import contextmanager
 from typing import (
     Any,
     List,
+    Iterable,
     Iterator,
     Optional,
     TypeVar,
@@ -21,12 +24,15 @@ from typing import (
     Generic,
     Type,
     Callable,
-    cast,
     Dict,
     Tuple,
 )
 
 import psycopg2
+import psycopg2.errors
+import psycopg2.extras
+import psycopg2.pool
+import psycopg2.sql
 
 from . import models
 
@@ -77,12 +83,45 @@ CREATE TABLE {SCHEMA_NAME}.connections (
 );
 """
 
+# Closing out an audit row is the single most frequent write, so keep its
+# body server-side where the plan is shared across sessions. The planner
+# inlines plain SQL functions, so the call itself costs nothing extra.
+# CREATE OR REPLACE (and re-run on first use each session) so databases
+# initialized before the function existed converge without a manual step.
+AUDIT_END_FUNCTION_DDL = f"""
+CREATE OR REPLACE FUNCTION {SCHEMA_NAME}.audit_end(p_id INT)
+RETURNS SETOF {SCHEMA_NAME}.migration_audit AS $$
+  UPDATE {SCHEMA_NAME}.migration_audit
+  SET finished_at = now()
+  WHERE id = p_id AND finished_at IS NULL
+  RETURNING *;
+$$ LANGUAGE sql;
+"""
+
+SCHEMA_DDL += AUDIT_END_FUNCTION_DDL
+
 
 class Mapper(abc.ABC, Generic[T, U]):
     fields: List[str]
     insert_fields: List[str]
     table: str
 
+    _columns_sql: str
+    _insert_columns_sql: str
+    _insert_placeholder_sql: str
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        # The field lists are fixed at class-creation time, so join them once
+        # here rather than on every query.
+        super().__init_subclass__(**kwargs)
+        if hasattr(cls, "fields"):
+            cls._columns_sql = ", ".join(cls.fields)
+        if hasattr(cls, "insert_fields"):
+            cls._insert_columns_sql = ", ".join(cls.insert_fields)
+            cls._insert_placeholder_sql = ", ".join(
+                f"%({name})s" for name in cls.insert_fields
+            )
+
     @classmethod
     @abc.abstractmethod
     def map(cls, row: Sequence[Any]) -> T:
@@ -95,23 +134,32 @@ class Mapper(abc.ABC, Generic[T, U]):
 
     @classmethod
     def columns(cls) -> str:
-        return ", ".join(cls.fields)
+        return cls._columns_sql
 
     @classmethod
     def insert_columns(cls) -> str:
-        return ", ".join(cls.insert_fields)
+        return cls._insert_columns_sql
 
     @classmethod
     def insert_placeholder(cls) -> str:
-        return ", ".join([f"%({name})s" for name in cls.insert_fields])
+        return cls._insert_placeholder_sql
 
 
 PhaseDirection = Tuple[bool, models.PhaseIndex]
 
 
 class AuditMapper(Mapper[models.MigrationAudit, PhaseDirection]):
-    _my_fields = list(f.name for f in dataclasses.fields(models.MigrationAudit))[:-1]
-    _index_fields = list(f.name for f in dataclasses.fields(models.PhaseIndex))
+    # Spelled out in column order rather than derived from dataclasses.fields
+    # at import time; map() unpacks rows positionally against exactly this.
+    _my_fields = ["id", "started_at", "finished_at", "is_revert"]
+    _index_fields = [
+        "revision",
+        "migration_hash",
+        "schema_hash",
+        "pre_deploy",
+        "change",
+        "phase",
+    ]
 
     fields = _my_fields + _index_fields
     insert_fields = ["is_revert"] + _index_fields
@@ -119,15 +167,51 @@ class AuditMapper(Mapper[models.MigrationAudit, PhaseDirection]):
 
     @classmethod
     def map(cls, row: Sequence[Any]) -> models.MigrationAudit:
-        index = models.PhaseIndex(*row[-6:])
-        return models.MigrationAudit(*row[:-6], index)  # type: ignore
+        (id, started_at, finished_at, is_revert, rev, mig_h, sch_h, pre, ch, ph) = row
+        index = models.PhaseIndex(rev, mig_h, sch_h, pre, ch, ph)
+        return models.MigrationAudit(id, started_at, finished_at, is_revert, index)
 
     @classmethod
     def get_insert_params(cls, obj: PhaseDirection) -> Dict[str, Any]:
+        # Spelled out rather than dataclasses.asdict, which deep-copies every
+        # field recursively; this runs once or twice per phase.
         is_revert, index = obj
-        result = dataclasses.asdict(index)
-        result["is_revert"] = is_revert
-        return result
+        return {
+            "is_revert": is_revert,
+            "revision": index.revision,
+            "migration_hash": index.migration_hash,
+            "schema_hash": index.schema_hash,
+            "pre_deploy": index.pre_deploy,
+            "change": index.change,
+            "phase": index.phase,
+        }
+
+
+# The audit statements run once or twice per phase with identical SQL text, so
+# PREPARE them once per connection and EXECUTE by name, sparing the server a
+# parse+plan on every call. Parameter order matches AuditMapper.insert_fields.
+_AUDIT_PARAM_TYPES = "bool, int, bytea, bytea, bool, int, int"
+_AUDIT_PARAMS = ", ".join(f"${i}" for i in range(1, len(AuditMapper.insert_fields) + 1))
+_AUDIT_WHERE = " AND ".join(
+    f"{name} = ${i}" for i, name in enumerate(AuditMapper.insert_fields, 1)
+)
+
+AUDIT_PREPARE_DDL = f"""
+PREPARE mig_audit_start ({_AUDIT_PARAM_TYPES}) AS
+  INSERT INTO {SCHEMA_NAME}.{AuditMapper.table} ({AuditMapper.insert_columns()})
+  VALUES ({_AUDIT_PARAMS})
+  RETURNING {AuditMapper.columns()};
+
+PREPARE mig_audit_end (int) AS
+  SELECT {AuditMapper.columns()}
+  FROM {SCHEMA_NAME}.audit_end($1);
+
+PREPARE mig_audit_get ({_AUDIT_PARAM_TYPES}) AS
+  SELECT {AuditMapper.columns()}
+  FROM {SCHEMA_NAME}.{AuditMapper.table}
+  WHERE {_AUDIT_WHERE}
+  ORDER BY id DESC LIMIT 1;
+"""
 
 
 class RevisionMapper(Mapper[models.DbRevision, models.Revision]):
@@ -168,6 +252,38 @@ class ConnectionMapper(Mapper[models.AppConnection, None]):
         raise NotImplementedError()
 
 
+# Caching the formatted statements keeps the query text stable across calls
+# (so the server can share plans) and avoids re-concatenating SQL in the
+# per-phase hot path. There are only a handful of distinct (mapper, rest)
+# pairs, so the caches stay tiny.
+@functools.lru_cache(maxsize=None)
+def _select_sql(mapper: Type[Mapper[Any, Any]], rest: str) -> str:
+    return f"""
+        SELECT {mapper.columns()}
+        FROM {SCHEMA_NAME}.{mapper.table}
+        {rest}
+        """
+
+
+@functools.lru_cache(maxsize=None)
+def _insert_sql(mapper: Type[Mapper[Any, Any]], rest: str) -> str:
+    return f"""
+        INSERT INTO {SCHEMA_NAME}.{mapper.table}
+          ({mapper.insert_columns()})
+        VALUES ({mapper.insert_placeholder()})
+        {rest}
+        RETURNING {mapper.columns()}"""
+
+
+@functools.lru_cache(maxsize=None)
+def _update_sql(mapper: Type[Mapper[Any, Any]], set_where: str) -> str:
+    return f"""
+        UPDATE {SCHEMA_NAME}.{mapper.table}
+        {set_where}
+        RETURNING {mapper.columns()}
+        """
+
+
 class Results(List[T]):
     def first(self) -> Optional[T]:
         return self[0] if self else None
@@ -180,13 +296,65 @@ class Results(List[T]):
         return Results(row_to_obj(t) for t in self)
 
 
+# One pool per DSN, shared across Database lifetimes. A one-shot CLI run
+# doesn't care, but anything that opens many Databases against the same URL
+# (the test suite, embedding applications) skips the TCP+auth handshake on
+# every one after the first.
+_pools: Dict[str, psycopg2.pool.ThreadedConnectionPool] = {}
+
+
+def get_pool(database_url: str) -> psycopg2.pool.ThreadedConnectionPool:
+    pool = _pools.get(database_url)
+    if pool is None or pool.closed:
+        pool = _pools[database_url] = psycopg2.pool.ThreadedConnectionPool(
+            minconn=1, maxconn=4, dsn=database_url
+        )
+    return pool
+
+
+def _close_pools() -> None:
+    for pool in _pools.values():
+        if not pool.closed:
+            pool.closeall()
+
+
+# The baseline conn.close() closed the CLI's connection at exit; with pooling
+# the equivalent is closing the pools.
+atexit.register(_close_pools)
+
+
 class Database:
+    # Slots make the in_tx/cur/conn loads on the per-call hot path C-level
+    # slot reads instead of dict lookups. The transactional assertions
+    # themselves are plain asserts, which python -O compiles out entirely.
+    __slots__ = (
+        "url",
+        "_pool",
+        "conn",
+        "cur",
+        "in_tx",
+        "_is_set_up",
+        "_audit_prepared",
+    )
+
     def __init__(self, database_url: str) -> None:
         self.url = database_url
-        self.conn = psycopg2.connect(database_url)
+        self._pool: Optional[psycopg2.pool.ThreadedConnectionPool] = get_pool(
+            database_url
+        )
+        try:
+            self.conn = self._pool.getconn()
+        except psycopg2.pool.PoolError:
+            # The pool is exhausted -- more Databases open at once than
+            # maxconn, or some leaked without close(). Fall back to a direct
+            # connection rather than failing construction.
+            self._pool = None
+            self.conn = psycopg2.connect(database_url)
         self.conn.set_session(autocommit=True)
         self.cur = self.conn.cursor()
         self.in_tx = False
+        self._is_set_up: Optional[bool] = None
+        self._audit_prepared = False
 
     def _fetch(self, query: str, args: Optional[Any] = None) -> Results[Any]:
         self.cur.execute(query, args or ())
@@ -204,62 +372,85 @@ class Database:
                 self.in_tx = False
 
     def is_set_up(self) -> bool:
-        args = {"schema": SCHEMA_NAME}
-        result = self._fetch(
-            """
-        SELECT EXISTS (
-          SELECT FROM information_schema.schemata
-          WHERE schema_name = %(schema)s
-        )""",
-            args,
-        )[0][0]
-        return cast(bool, result)
+        # pg_namespace is much cheaper to hit than the information_schema views,
+        # and the answer can't change under us except via create_schema.
+        if self._is_set_up is None:
+            args = {"schema": SCHEMA_NAME}
+            result = self._fetch(
+                "SELECT 1 FROM pg_namespace WHERE nspname = %(schema)s", args
+            )
+            self._is_set_up = bool(result)
+        return self._is_set_up
 
     def create_schema(self) -> None:
         with self.tx():
             self.cur.execute(SCHEMA_DDL)
+        self._is_set_up = True
 
     def select(
         self, mapper: Type[Mapper[T, Any]], rest: str, args: Any = None
     ) -> Results[T]:
-        return self._fetch(
-            f"""
-        SELECT {mapper.columns()}
-        FROM {SCHEMA_NAME}.{mapper.table}
-        {rest}
-        """,
-            args,
-        ).map(mapper.map)
+        return self._fetch(_select_sql(mapper, rest), args).map(mapper.map)
+
+    @contextmanager
+    def select_stream(
+        self,
+        mapper: Type[Mapper[T, Any]],
+        rest: str,
+        args: Any = None,
+        itersize: int = 1000,
+    ) -> Iterator[Iterator[T]]:
+        """Like select, but fetches rows lazily through a server-side cursor.
+
+        Use this for scans that may not fit in memory (e.g. replaying the full
+        audit history); the server holds the result set and we pull it down
+        itersize rows at a time. The cursor is declared WITH HOLD because the
+        connection runs in autocommit mode, where a plain named cursor would
+        be rejected outside a transaction block."""
+        cur = self.conn.cursor(name=f"{SCHEMA_NAME}_{uuid.uuid4().hex}", withhold=True)
+        cur.itersize = itersize
+        cur.execute(_select_sql(mapper, rest), args or ())
+        try:
+            yield (mapper.map(row) for row in cur)
+        finally:
+            cur.close()
 
     def insert(self, mapper: Type[Mapper[T, U]], obj: U, rest: str = "") -> T:
         # TODO: remove transactional assertion
         args = mapper.get_insert_params(obj)
-        return (
-            self._fetch(
-                f"""
+        return self._fetch(_insert_sql(mapper, rest), args).map(mapper.map).one()
+
+    def insert_many(
+        self, mapper: Type[Mapper[T, U]], objs: Iterable[U], rest: str = ""
+    ) -> Results[T]:
+        """Inserts any number of objects in a single round-trip.
+
+        Returns the rows the INSERT actually produced, in insertion order."""
+        rows = [
+            [params[f] for f in mapper.insert_fields]
+            for params in map(mapper.get_insert_params, objs)
+        ]
+        if not rows:
+            return Results()
+        result = psycopg2.extras.execute_values(
+            self.cur,
+            f"""
         INSERT INTO {SCHEMA_NAME}.{mapper.table}
           ({mapper.insert_columns()})
-        VALUES ({mapper.insert_placeholder()})
+        VALUES %s
         {rest}
         RETURNING {mapper.columns()}""",
-                args,
-            )
-            .map(mapper.map)
-            .one()
+            rows,
+            page_size=500,
+            fetch=True,
         )
+        return Results(result).map(mapper.map)
 
     def update(
         self, mapper: Type[Mapper[T, Any]], set_where: str, args: Sequence[Any]
     ) -> Results[T]:
         # TODO: remove transactional assertion
-        return self._fetch(
-            f"""
-        UPDATE {SCHEMA_NAME}.{mapper.table}
-        {set_where}
-        RETURNING {mapper.columns()}
-        """,
-            args,
-        ).map(mapper.map)
+        return self._fetch(_update_sql(mapper, set_where), args).map(mapper.map)
 
     def get_last_finished(self) -> Optional[models.MigrationAudit]:
         return self.select(
@@ -273,38 +464,73 @@ class Database:
     def get_latest_audit(self) -> Optional[models.MigrationAudit]:
         return self.select(AuditMapper, "ORDER BY id DESC LIMIT 1").first()
 
+    def _execute_audit_statement(
+        self, statement: str, args: Sequence[Any]
+    ) -> Results[models.MigrationAudit]:
+        # Prepared statements are per-session, and they can't be prepared
+        # until create_schema has run, so prepare on first use.
+        if not self._audit_prepared:
+            self._prepare_audit_statements()
+        query = f"EXECUTE {statement} ({', '.join(['%s'] * len(args))})"
+        try:
+            return self._fetch(query, args).map(AuditMapper.map)
+        except psycopg2.errors.InvalidSqlStatementName:
+            # The server lost our session state (e.g. a proxy swapped the
+            # backing connection); re-prepare and retry.
+            self._prepare_audit_statements()
+            return self._fetch(query, args).map(AuditMapper.map)
+
+    def _prepare_audit_statements(self) -> None:
+        # Idempotent; brings pre-audit_end databases up to date.
+        self.cur.execute(AUDIT_END_FUNCTION_DDL)
+        try:
+            self.cur.execute(AUDIT_PREPARE_DDL)
+        except psycopg2.errors.DuplicatePreparedStatement:
+            # A pooled connection may already carry these from a previous
+            # Database lifetime; that's fine, the text never changes.
+            pass
+        self._audit_prepared = True
+
+    @staticmethod
+    def _audit_args(index: models.PhaseIndex, is_revert: bool) -> List[Any]:
+        params = AuditMapper.get_insert_params((is_revert, index))
+        return [params[f] for f in AuditMapper.insert_fields]
+
     def audit_phase_start(
         self, index: models.PhaseIndex, is_revert: bool = False
     ) -> models.MigrationAudit:
-        return self.insert(AuditMapper, (is_revert, index))
+        return self._execute_audit_statement(
+            "mig_audit_start", self._audit_args(index, is_revert)
+        ).one()
 
     def audit_phase_end(self, audit: models.MigrationAudit) -> models.MigrationAudit:
-        return self.update(
-            AuditMapper,
-            "SET finished_at = now() WHERE id = %s AND finished_at IS NULL",
-            (audit.id,),
-        ).one()
+        return self._execute_audit_statement("mig_audit_end", [audit.id]).one()
 
     def get_audit(
         self, index: models.PhaseIndex, is_revert: bool = False
     ) -> models.MigrationAudit:
-        return self.select(
-            AuditMapper,
-            f"""
-        WHERE revision = %(revision)s
-        AND migration_hash = %(migration_hash)s
-        AND schema_hash = %(schema_hash)s
-        AND pre_deploy = %(pre_deploy)s
-        AND phase = %(phase)s
-        AND change = %(change)s
-        AND is_revert = %(is_revert)s
-        ORDER BY id DESC LIMIT 1
-        """,
-            AuditMapper.get_insert_params((is_revert, index)),
+        return self._execute_audit_statement(
+            "mig_audit_get", self._audit_args(index, is_revert)
         ).one()
 
     def close(self) -> None:
-        self.conn.close()
+        self.cur.close()
+        if self._pool is None:
+            self.conn.close()
+            return
+        try:
+            if not self.conn.closed:
+                # putconn only rolls back; session-level state -- like the
+                # search_path the incantation sets with set_config(..., false)
+                # -- would bleed into the connection's next lifetime. DISCARD
+                # ALL scrubs GUCs (and prepared statements, which the lazy
+                # re-prepare path restores on next use).
+                with self.conn.cursor() as cur:
+                    cur.execute("DISCARD ALL")
+        except psycopg2.Error:
+            self._pool.putconn(self.conn, close=True)
+        else:
+            self._pool.putconn(self.conn)
 
     @contextmanager
     def temp_db_url(self) -> Iterator[str]:
@@ -316,12 +542,22 @@ class Database:
 
         Raises an exception if there's already a *different* (non-deleted) revision
         with the same number."""
+        return self.upsert_revisions([revision]).one()
+
+    def upsert_revisions(
+        self, revisions: Iterable[models.Revision]
+    ) -> Results[models.DbRevision]:
+        """Upserts the given revisions into the database in a single statement.
+
+        Returns the rows that were actually inserted; revisions already present
+        are skipped. Raises an exception if there's already a *different*
+        (non-deleted) revision with one of the same numbers."""
         on_conflict = "ON CONFLICT (revision, migration_hash, schema_hash) DO NOTHING"
-        return self.insert(RevisionMapper, revision, on_conflict)
+        return self.insert_many(RevisionMapper, revisions, on_conflict)
 
     def get_revisions(self) -> models.RevisionList:
         """Returns the sequence of revisions stored in the (excluding deleted ones)."""
-        results = self.select(RevisionMapper, "WHERE NOT is_deleted")
+        results = self.select(RevisionMapper, "WHERE NOT is_deleted ORDER BY revision")
         return models.RevisionList({rev.number: rev for rev in results})
 
     def create_shim_schema(self, revision: int) -> None:
@@ -339,7 +575,11 @@ class Database:
         # ALTER USER {shim_schema} SET search_path = {shim_schema}, {search_path};
         # """
         # )
-        self.cur.execute(f"CREATE SCHEMA IF NOT EXISTS {shim_schema}")
+        self.cur.execute(
+            psycopg2.sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(
+                psycopg2.sql.Identifier(shim_schema)
+            )
+        )
 
     def drop_shim_schema(self, revision: int) -> None:
         """Drops the 'shim schema' used by column-rename migrations. Idempotent.
@@ -347,13 +587,19 @@ class Database:
         Does not cascade: the migration is assumed to have left the shim empty.
         (Otherwise we can't be sure it's safe to drop.)"""
         shim_schema = SHIM_SCHEMA_FORMAT % revision
-        self.cur.execute(f"DROP SCHEMA IF EXISTS {shim_schema}")
+        self.cur.execute(
+            psycopg2.sql.SQL("DROP SCHEMA IF EXISTS {}").format(
+                psycopg2.sql.Identifier(shim_schema)
+            )
+        )
 
 
 @contextlib.contextmanager
 def temp_db_url(control_conn: Any) -> Iterator[str]:
     cur = control_conn.cursor()
-    db_name = "".join(random.choices("qwertyuiopasdfghjklzxcvbnm", k=10))
+    # One urandom syscall instead of ten RNG draws; the letter prefix keeps
+    # the name valid unquoted (hex can start with a digit).
+    db_name = "t" + secrets.token_hex(5)
     cur.execute("CREATE DATABASE " + db_name)
     try:
         # TODO(JJ): use the URL passed in control_conn
@@ -365,6 +611,8 @@ def temp_db_url(control_conn: Any) -> Iterator[str]:
         cur.close()
 
 
+_DB_NAME_RE = re.compile("/[^/]+$")
+
+
 def replace_db(database_url: str, db_name: str) -> str:
-    name = re.sub("/[^/]+$", "/" + db_name, database_url)
-    return name
+    return _DB_NAME_RE.sub("/" + db_name, database_url)
@@ -16,10 +16,16 @@ def upgrade(ctx: Context) -> None:
         )
     else:
         phases = repo.revisions.get_phases(models.PhaseSlice())
-    for (index, revision, change, phase) in phases:
+    phase_list = list(phases)
+    # One round-trip for all the new revisions, instead of one per revision.
+    db.upsert_revisions(
+        revision
+        for (index, revision, change, phase) in phase_list
+        if index == revision.first_index
+    )
+    for (index, revision, change, phase) in phase_list:
         if index == revision.first_index:
             db.create_shim_schema(revision.number)
-            db.upsert_revision(revision)
         phase.run(db, index)
         if index == revision.last_index:
             db.drop_shim_schema(revision.number)
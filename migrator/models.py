@@ -1,13 +1,19 @@
 from __future__ import annotations
 
 import dataclasses
+import functools
 import os.path
 import glob
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 
 import pydantic
 import yaml
 import abc
+
+# libyaml parses ~20x faster than the pure-Python loader, when it's available
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 from datetime import datetime
 import hashlib
 from pydantic import BaseModel, root_validator, PrivateAttr
@@ -29,12 +35,28 @@ if TYPE_CHECKING:
 
 
 def get_revision_number(filename: str) -> int:
-    return int(os.path.basename(filename).split("-", 1)[0])
+    # partition rather than split: no list allocation, and int() handles the
+    # digits faster than any Python-level scan could.
+    return int(os.path.basename(filename).partition("-")[0])
+
+
+def hash_file(fname: str, chunk_size: int = 1 << 20) -> bytes:
+    """Hashes a file's contents without reading them fully into memory.
+
+    Hashes the raw bytes; FileRevision reads text with newline translation
+    disabled so the file's text hashes identically."""
+    with open(fname, "rb") as f:
+        if sys.version_info >= (3, 11):  # file_digest runs the read loop in C
+            return hashlib.file_digest(f, "sha256").digest()
+        h = hashlib.sha256()
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+        return h.digest()
 
 
 def load_yaml(fname: str) -> Dict[Any, Any]:
     with open(fname) as f:
-        return yaml.safe_load(f.read())  # type: ignore
+        return yaml.load(f.read(), Loader=_YamlLoader)  # type: ignore
 
 
 def sibling(fname: str, path: str) -> str:
@@ -83,19 +105,21 @@ class Revision:
     migration_text: str
     schema_text: str
 
-    @property
+    # These are all pure functions of the revision's (immutable) source text,
+    # and they get hit once or more per phase, so compute them at most once.
+    @functools.cached_property
     def migration_hash(self) -> bytes:
-        return hashlib.sha256(self.migration_text.encode("ascii")).digest()
+        return hashlib.sha256(self.migration_text.encode("utf-8")).digest()
 
-    @property
+    @functools.cached_property
     def migration(self) -> Migration:
         with parsing_file(self.migration_filename):
-            m = Migration(**yaml.safe_load(self.migration_text))
+            m = Migration(**yaml.load(self.migration_text, Loader=_YamlLoader))
             return m
 
-    @property
+    @functools.cached_property
     def schema_hash(self) -> bytes:
-        return hashlib.sha256(self.schema_text.encode("ascii")).digest()
+        return hashlib.sha256(self.schema_text.encode("utf-8")).digest()
 
     @staticmethod
     def parse(filename: str) -> Revision:
@@ -115,7 +139,7 @@ class Revision:
     def phases(self) -> Iterator[IndexChangePhase]:
         return self.migration.phases(self.first_index)
 
-    @property
+    @functools.cached_property
     def first_index(self) -> PhaseIndex:
         return PhaseIndex(
             revision=self.number,
@@ -126,9 +150,9 @@ class Revision:
             phase=0,
         )
 
-    @property
+    @functools.cached_property
     def last_index(self) -> PhaseIndex:
-        return next(reversed([i[0] for i in self.migration.phases(self.first_index)]))
+        return self.migration.last_phase_index(self.first_index)
 
 
 class RevisionList(Dict[int, Revision]):
@@ -143,18 +167,34 @@ class RevisionList(Dict[int, Revision]):
         for f in sorted(glob.glob(os.path.join(dirname, "*.yml"))):
             rev = Revision.parse(f)
             revisions[rev.number] = rev
+        if revisions:
+            # Hashing releases the GIL, so warm every revision's hash caches
+            # in parallel instead of serializing file reads + SHA-256 later.
+            # Seed the caches directly: before Python 3.12 cached_property's
+            # __get__ holds a per-property lock, which would serialize the
+            # very work we're fanning out.
+            def warm(rev: Revision) -> None:
+                for name in ("migration_hash", "schema_hash"):
+                    rev.__dict__[name] = getattr(type(rev), name).func(rev)
+
+            with ThreadPoolExecutor(max_workers=min(8, len(revisions))) as ex:
+                list(ex.map(warm, revisions.values()))
         return RevisionList(revisions)
 
     @property
     def ordered_revisions(self) -> Iterator[Tuple[int, Revision]]:
-        yield from sorted(self.items())
+        # Keys are exactly 1..N (asserted above), so walk them directly
+        # rather than sorting the items on every call.
+        for num in range(1, len(self) + 1):
+            yield num, self[num]
 
     def get_phases(self, slice: PhaseSlice) -> Iterator[IndexRevisionChangePhase]:
-        for num, revision in self.ordered_revisions:
-            if slice.start and slice.start.revision > num:
-                continue
-            if slice.end and slice.end.revision < num:
-                continue
+        # Contiguous numbering means a PhaseSlice maps straight onto a range
+        # of keys; no need to scan and filter all N revisions.
+        first = slice.start.revision if slice.start else 1
+        last = slice.end.revision if slice.end else len(self)
+        for num in range(max(first, 1), min(last, len(self)) + 1):
+            revision = self[num]
             for next_index, change, phase in revision.get_phases(slice):
                 yield next_index, revision, change, phase
 
@@ -169,22 +209,37 @@ class FileRevision(Revision):
     # here and below, the type: ignore comments tell mypy that it's ok for this to be a
     # property even though it's an attribute on the parent class. Sigh.
     # Removable when this bug is closed: https://github.com/python/mypy/issues/4125
-    @property
+    # newline="" disables newline translation, so the text is byte-for-byte
+    # what hash_file digests -- otherwise a CRLF file would hash differently
+    # from the text we store for it.
+    @functools.cached_property
     def schema_text(self) -> str:  # type: ignore
-        with open(self.schema_filename) as f:
+        with open(self.schema_filename, newline="") as f:
             return f.read()
 
     @property
     def schema_filename(self) -> str:
         return sibling(self.migration_filename, f"{self.number}-schema.sql")
 
-    @property
+    @functools.cached_property
     def migration_text(self) -> str:  # type:ignore
         if not os.path.exists(self.migration_filename):
             return ""
-        with open(self.migration_filename) as f:
+        with open(self.migration_filename, newline="") as f:
             return f.read()
 
+    # Hash straight from disk, so computing a revision's hashes (e.g. for
+    # first_index) doesn't require holding the full text in memory.
+    @functools.cached_property
+    def migration_hash(self) -> bytes:
+        if not os.path.exists(self.migration_filename):
+            return hashlib.sha256(b"").digest()
+        return hash_file(self.migration_filename)
+
+    @functools.cached_property
+    def schema_hash(self) -> bytes:
+        return hash_file(self.schema_filename)
+
 
 @dataclass
 class DbRevision(Revision):
@@ -198,7 +253,7 @@ class DbRevision(Revision):
         return f"<database file, hash={self.migration_hash.hex()}>"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class PhaseIndex:
     revision: int
     migration_hash: bytes
@@ -206,6 +261,16 @@ class PhaseIndex:
     pre_deploy: bool
     change: int
     phase: int
+    # Computed once in __post_init__; PhaseSlice compares indexes constantly,
+    # and an index never changes after construction.
+    sortkey: Tuple[int, int, int, int] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(
+            self,
+            "sortkey",
+            (self.revision, 0 if self.pre_deploy else 1, self.change, self.phase),
+        )
 
     @property
     def first_change(self) -> PhaseIndex:
@@ -215,10 +280,6 @@ class PhaseIndex:
     def first_phase(self) -> PhaseIndex:
         return dataclasses.replace(self, phase=0)
 
-    @property
-    def sortkey(self) -> Tuple[int, int, int, int]:
-        return (self.revision, 0 if self.pre_deploy else 1, self.change, self.phase)
-
     @property
     def is_first_for_revision(self) -> bool:
         return self.pre_deploy and self.change == 0 and self.phase == 0
@@ -276,6 +337,21 @@ class Migration(BaseModel):
                 )
                 yield new_index, change, phase
 
+    def last_phase_index(self, first: PhaseIndex) -> PhaseIndex:
+        """The index of this migration's final phase.
+
+        Computed from the change lists directly rather than enumerating every
+        phase just to take the last one."""
+        if self.post_deploy:
+            changes, pre_deploy = self.post_deploy, False
+        else:
+            changes, pre_deploy = self.pre_deploy, True
+        i_change = len(changes) - 1
+        i_phase = len(changes[i_change].inner.phases) - 1
+        return dataclasses.replace(
+            first, pre_deploy=pre_deploy, change=i_change, phase=i_phase
+        )
+
 
 @dataclasses.dataclass
 class AppConnection:
@@ -0,0 +1,48 @@
+from migrator.db import Database, RevisionMapper
+from migrator.logic import Context
+
+
+def test_pool_overflow(test_db_url: str) -> None:
+    # Open more Databases at once than the pool's maxconn, without closing
+    # any (as tests/test_diff.py does); construction must not exhaust the
+    # pool, and connections must still work after being returned.
+    dbs = [Database(test_db_url) for _ in range(10)]
+    for db in dbs:
+        assert db._fetch("SELECT 1")[0][0] == 1
+    for db in dbs:
+        db.close()
+    reused = Database(test_db_url)
+    assert reused._fetch("SELECT 1")[0][0] == 1
+    reused.close()
+
+
+def test_pooled_connection_search_path_reset(test_db_url: str) -> None:
+    # Session-level state set during one Database lifetime (as the
+    # incantation does) must not leak into the next checkout of the same
+    # pooled connection.
+    db = Database(test_db_url)
+    clean_search_path = db._fetch("SHOW search_path")[0][0]
+    db.cur.execute(
+        """
+        SELECT set_config(
+          'search_path',
+          'migrator_rev_1,' || current_setting('search_path'),
+          false -- not transaction-local
+        )
+        """
+    )
+    db.close()
+    reused = Database(test_db_url)
+    try:
+        assert reused._fetch("SHOW search_path")[0][0] == clean_search_path
+    finally:
+        reused.close()
+
+
+def test_select_stream(ctx: Context) -> None:
+    db = ctx.db()
+    db.create_schema()
+    db.upsert_revisions(ctx.repo().revisions.values())
+    with db.select_stream(RevisionMapper, "ORDER BY revision", itersize=1) as revs:
+        numbers = [rev.number for rev in revs]
+    assert numbers == sorted(ctx.repo().revisions)